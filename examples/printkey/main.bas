@@ -0,0 +1,9 @@
+' PRINT lists that mix text with function calls
+' must show each item before the next one is evaluated,
+' so the prompt is visible while INKEY$ waits for a key
+
+CLS
+LABEL waitkey
+    PRINT "PRESS A KEY: "; INKEY$
+    PRINT "CODE 65 IS "; CHR$(65); " AND 255 IS &"; HEX$(255)
+    GOTO waitkey
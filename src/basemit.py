@@ -15,88 +15,88 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
 """
 import sys
-from typing import List, Tuple, Dict, Optional
-from bastypes import Expression, Symbol, BASTypes
+from typing import List, Tuple, Dict, Optional, Final
+from bastypes import Expression, Symbol, BASTypes, TokenType
 
 class SMI:
     """ Stack Machine Instructions """
-    NOP     = 'NOP'
-    REM     = 'REM'
-    LABEL   = 'LABEL'
-    PUSH    = 'PUSH'
-    CLEAR   = 'CLEAR'
-    DROP    = 'DROP'
-    LDVAL   = 'LDVAL'
-    LDMEM   = 'LDMEM'
-    STMEM   = 'STMEM'
-    LDLREF  = 'LDLREF'
-    LDLOCL  = 'LDLOCL'
-    STLOCL  = 'STLOCL'
-    STINDR  = 'STINDR'
-    STINDB  = 'STINDB'
-    INCGLOB = 'INCGLOB'
-    INCLOCL = 'INCLOCL'
-    INC     = 'INC'
-    INCR    = 'INCR'
-    STACK   = 'STACK'
-    UNSTACK = 'UNSTACK'
-    LOCLVEC = 'LOCLVEC'
-    GLOBVEC = 'GLOBVEC'
-    INDEX   = 'INDEX'
-    DEREF   = 'DEREF'
-    INDXB   = 'INDXB'
-    DREFB   = 'DREFB'
-    CALL    = 'CALL'
-    CALR    = 'CALR'
-    LIBCALL = 'LIBCALL'
-    JUMP    = 'JUMP'
-    RJUMP   = 'RJUMP'
-    JMPFALSE= 'JMPFALSE'
-    JMPTRUE = 'JMPTRUE'
-    FOR     = 'FOR'
-    FORDOWN = 'FORDOWN'
-    MKFRAME = 'MKFRAME'
-    DELFRAME= 'DELFRAME'
-    RET     = 'RET'
-    HALT    = 'HALT'
-    NEG     = 'NEG'
-    INV     = 'INV'
-    LOGNOT  = 'LOGNOT'
-    ADD     = 'ADD'
-    SUB     = 'SUB'
-    MUL     = 'MUL'
-    DIV     = 'DIV'
-    MOD     = 'MOD'
-    AND     = 'AND'
-    OR      = 'OR'
-    XOR     = 'XOR'
-    SHL     = 'SHL'
-    SHR     = 'SHR'
-    EQ      = 'EQ'
-    NE      = 'NE'
-    LT      = 'LT'
-    GT      = 'GT'
-    LE      = 'LE'
-    GE      = 'GE'
-    UMUL    = 'UMUL'
-    UDIV    = 'UDIV'
-    ULT     = 'ULT'
-    UGT     = 'UGT'
-    ULE     = 'ULE'
-    UGE     = 'UGE'
-    JMPEQ   = 'JMPEQ'
-    JMPNE   = 'JMPNE'
-    JMPLT   = 'JMPLT'
-    JMPGT   = 'JMPGT'
-    JMPLE   = 'JMPLE'
-    JMPGE   = 'JMPGE'
-    JMPULT  = 'JMPULT'
-    JMPUGT  = 'JMPUGT'
-    JMPULE  = 'JMPULE'
-    JMPUGE  = 'JMPUGE'
-    RMEM    = 'RMEM'
-    FILLMEM = 'FILLMEM'
-    SKIP    = 'SKIP'
+    NOP:      Final = 'NOP'
+    REM:      Final = 'REM'
+    LABEL:    Final = 'LABEL'
+    PUSH:     Final = 'PUSH'
+    CLEAR:    Final = 'CLEAR'
+    DROP:     Final = 'DROP'
+    LDVAL:    Final = 'LDVAL'
+    LDMEM:    Final = 'LDMEM'
+    STMEM:    Final = 'STMEM'
+    LDLREF:   Final = 'LDLREF'
+    LDLOCL:   Final = 'LDLOCL'
+    STLOCL:   Final = 'STLOCL'
+    STINDR:   Final = 'STINDR'
+    STINDB:   Final = 'STINDB'
+    INCGLOB:  Final = 'INCGLOB'
+    INCLOCL:  Final = 'INCLOCL'
+    INC:      Final = 'INC'
+    INCR:     Final = 'INCR'
+    STACK:    Final = 'STACK'
+    UNSTACK:  Final = 'UNSTACK'
+    LOCLVEC:  Final = 'LOCLVEC'
+    GLOBVEC:  Final = 'GLOBVEC'
+    INDEX:    Final = 'INDEX'
+    DEREF:    Final = 'DEREF'
+    INDXB:    Final = 'INDXB'
+    DREFB:    Final = 'DREFB'
+    CALL:     Final = 'CALL'
+    CALR:     Final = 'CALR'
+    LIBCALL:  Final = 'LIBCALL'
+    JUMP:     Final = 'JUMP'
+    RJUMP:    Final = 'RJUMP'
+    JMPFALSE: Final = 'JMPFALSE'
+    JMPTRUE:  Final = 'JMPTRUE'
+    FOR:      Final = 'FOR'
+    FORDOWN:  Final = 'FORDOWN'
+    MKFRAME:  Final = 'MKFRAME'
+    DELFRAME: Final = 'DELFRAME'
+    RET:      Final = 'RET'
+    HALT:     Final = 'HALT'
+    NEG:      Final = 'NEG'
+    INV:      Final = 'INV'
+    LOGNOT:   Final = 'LOGNOT'
+    ADD:      Final = 'ADD'
+    SUB:      Final = 'SUB'
+    MUL:      Final = 'MUL'
+    DIV:      Final = 'DIV'
+    MOD:      Final = 'MOD'
+    AND:      Final = 'AND'
+    OR:       Final = 'OR'
+    XOR:      Final = 'XOR'
+    SHL:      Final = 'SHL'
+    SHR:      Final = 'SHR'
+    EQ:       Final = 'EQ'
+    NE:       Final = 'NE'
+    LT:       Final = 'LT'
+    GT:       Final = 'GT'
+    LE:       Final = 'LE'
+    GE:       Final = 'GE'
+    UMUL:     Final = 'UMUL'
+    UDIV:     Final = 'UDIV'
+    ULT:      Final = 'ULT'
+    UGT:      Final = 'UGT'
+    ULE:      Final = 'ULE'
+    UGE:      Final = 'UGE'
+    JMPEQ:    Final = 'JMPEQ'
+    JMPNE:    Final = 'JMPNE'
+    JMPLT:    Final = 'JMPLT'
+    JMPGT:    Final = 'JMPGT'
+    JMPLE:    Final = 'JMPLE'
+    JMPGE:    Final = 'JMPGE'
+    JMPULT:   Final = 'JMPULT'
+    JMPUGT:   Final = 'JMPUGT'
+    JMPULE:   Final = 'JMPULE'
+    JMPUGE:   Final = 'JMPUGE'
+    RMEM:     Final = 'RMEM'
+    FILLMEM:  Final = 'FILLMEM'
+    SKIP:     Final = 'SKIP'
 
 class SMEmitter:
     """
@@ -125,6 +125,10 @@ class SMEmitter:
     def label(self, text: str) -> None:
         self._emit(SMI.LABEL, text, prefix='')
 
+    def srcline(self, text: str, label: str) -> None:
+        """ Remark with a BASIC source line followed by the label of that line """
+        self.code += ((SMI.REM, text.strip(), ''), (SMI.LABEL, label, ''))
+
     def load_num(self, value: str) -> None:
         self._emit(SMI.LDVAL, value)
 
@@ -180,26 +184,33 @@ class SMEmitter:
             self.abort(f"Operation {op} is not currently supported with strings")
 
     def expression(self, expression: Expression) -> None:
-        for i, (token, type) in enumerate(expression.expr):
-            if token.is_int():
-                if i > 0: self._emit(SMI.PUSH)
-                self.load_num(token.text)
-            elif token.is_ident():
-                if i > 0: self._emit(SMI.PUSH)
+        """ Emits the expression walking its postfix list once """
+        tokens = expression.tokens
+        types = expression.types
+        last = len(tokens) - 1
+        emit = self._emit
+        for i, token in enumerate(tokens):
+            type = types[i]
+            tktype = token.type
+            if tktype is TokenType.INTEGER:
+                if i > 0: emit(SMI.PUSH)
+                emit(SMI.LDVAL, token.text)
+            elif tktype is TokenType.IDENT:
+                if i > 0: emit(SMI.PUSH)
                 # check if next operant is @ (get memory address)
-                next_at = (i + 1) < len(expression.expr) and expression.expr[i+1][0].text == 'AT'
-                if not next_at and type == BASTypes.INT:
+                next_at = i < last and tokens[i+1].text == 'AT'
+                if not next_at and type is BASTypes.INT:
                     # only integers are loaded directly, string, reals or memory addresses does not
-                    self.load_symbol(token.text)
+                    emit(SMI.LDMEM, token.text)
                 else:
-                    self._emit(SMI.LDVAL, token.text)          
+                    emit(SMI.LDVAL, token.text)
             else:
-                if   type == BASTypes.INT: self.operate_int(token.text)
-                elif type == BASTypes.REAL:self.operate_real(token.text)
-                elif type == BASTypes.STR: self.operate_str(token.text)
+                if   type is BASTypes.INT: self.operate_int(token.text)
+                elif type is BASTypes.REAL:self.operate_real(token.text)
+                elif type is BASTypes.STR: self.operate_str(token.text)
                 else:
                     # Expression is bad formed due to errors and operant is still BASTypes.NONE
-                    self._emit(SMI.NOP)
+                    emit(SMI.NOP)
     
     def logical_expr(self, expr: Expression, jumplabel: str) -> None:
         self.expression(expr)
@@ -251,13 +262,13 @@ class SMEmitter:
         try:
             if self.symbol_start == 256:
                 self.warning("SYMBOL command appears before a SYMBOL AFTER")
-            sym = int(args[0].expr[0][0].text, 0)
+            sym = int(args[0].tokens[0].text, 0)
             self.symbol_start = min(self.symbol_start, sym)
             values: List[str] = []
             for e in args[1:]:
-                values.append(e.expr[0][0].text)
+                values.append(e.tokens[0].text)
         except:
-            self.abort("wrong symbol value in SYMBOL command: " + args[0].expr[0][0].text)
+            self.abort("wrong symbol value in SYMBOL command: " + args[0].tokens[0].text)
         try:
             numbers: List[int] = []
             for v in values:
@@ -278,10 +289,10 @@ class SMEmitter:
 
     def symbolafter(self, args: List[Expression]) -> None:
         try:
-            value = int(args[0].expr[0][0].text, 0)
+            value = int(args[0].tokens[0].text, 0)
             self.symbol_start = value
         except:
-            self.abort("wrong value in SYMBOL AFTER: " + args[0].expr[0][0].text)
+            self.abort("wrong value in SYMBOL AFTER: " + args[0].tokens[0].text)
         self.load_num(str(value))
         self._emit(SMI.PUSH)
         self.load_addr("_user_symbol_table")
@@ -309,4 +320,3 @@ class SMEmitter:
                 self._emit(SMI.PUSH)    # previous arg value
                 self.expression(args[i])
         self._emit(SMI.LIBCALL, fname)
-
@@ -239,24 +239,36 @@ class BASLexer:
             text = self._get_identifier_text()
             keyword = Token.get_keyword(text)
             if keyword is not None:
-                token = Token(text, keyword, self.cur_line)
+                # keywords repeat all over the code, so all share one string
+                token = Token(sys.intern(text), keyword, self.cur_line)
             elif text.upper() == 'MOD':
                 token = Token('%', TokenType.MOD, self.cur_line)
             else:
-                # Identifier or label
-                token = Token(text, TokenType.IDENT, self.cur_line)
+                # Identifier or label, interned as it will be used as key in
+                # the parser name cache and the symbols table
+                token = Token(sys.intern(text), TokenType.IDENT, self.cur_line)
         else:
             self.abort("unexpected character found '" + self.cur_char + "'")
 
         if token is not None:
             token.srcpos = inipos
-            if token.type == TokenType.NEWLINE:
+            if token.type is TokenType.NEWLINE:
                 # we are going to start a new line of code
                 self.cur_line = self.cur_line + 1
             self.last_token = token
         self.next_char()
         return token
 
+    def skip_line(self) -> Optional[Token]:
+        """
+        Jumps to the end of the current line without building the tokens in between
+        and returns the NEWLINE token (or CODE_EOF if there are no more lines).
+        """
+        nlpos = self.source.find('\n', self.cur_pos)
+        self.cur_pos = (nlpos if nlpos != -1 else len(self.source)) - 1
+        self.next_char()
+        return self.get_token()
+
     def lstrip(self) -> None:
         """Skip whitespace except newlines, which we will use to indicate the end of a statement."""
         while self.cur_char == ' ' or self.cur_char == '\t' or self.cur_char == '\r':
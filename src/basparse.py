@@ -19,20 +19,76 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
 
 import sys
 import os
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Dict, Callable
 from baslex import BASLexer
 from basemit import SMEmitter
 from bastypes import SymTypes, Symbol, SymbolTable, Token, TokenType, ErrorCode, Expression, BASTypes
 from bastypes import CodeBlock, CodeBlockType, ForBlockInfo
 
+# Variable name suffixes that force the type of the variable
+SYMNAME_SUFFIXES: Dict[str, Tuple[str, BASTypes]] = {
+    '$': ('_str', BASTypes.STR),
+    '!': ('_real', BASTypes.REAL),
+    '%': ('_int', BASTypes.INT),
+}
+
+# Constant expressions shared by all the rules that need them, neither
+# the parser nor the emitter modify an expression once it is complete
+EXPR_INT_0 = Expression.int('0')
+EXPR_INT_4 = Expression.int('4')
+EXPR_STR_EMPTY = Expression.string("")
+
+# Names of temporal variables and labels, shared by all parser instances
+TMPVAR_NAMES: List[str] = []
+TMPLABEL_NAMES: List[str] = []
+
+# TokenType members used by the hottest rules, bound to module names so
+# each test is a single global lookup
+T_IDENT = TokenType.IDENT
+T_INTEGER = TokenType.INTEGER
+T_REAL = TokenType.REAL
+T_STRING = TokenType.STRING
+T_LPAR = TokenType.LPAR
+T_RPAR = TokenType.RPAR
+T_MINUS = TokenType.MINUS
+T_NEG = TokenType.NEG
+T_NOT = TokenType.NOT
+T_NEWLINE = TokenType.NEWLINE
+T_CODE_EOF = TokenType.CODE_EOF
+T_COLON = TokenType.COLON
+
+# Binary operators and their precedence levels, from the loosest to the
+# tightest binding one. All of them are left associative. NOT is a prefix
+# operator that sits between AND and the comparisons.
+BINARY_OPS: Dict[TokenType, int] = {
+    TokenType.XOR: 1,
+    TokenType.OR: 2,
+    TokenType.AND: 3,
+    TokenType.EQ: 5, TokenType.NOTEQ: 5, TokenType.GT: 5,
+    TokenType.LT: 5, TokenType.GTEQ: 5, TokenType.LTEQ: 5,
+    TokenType.PLUS: 6, TokenType.MINUS: 6,
+    TokenType.MOD: 7,
+    TokenType.ASTERISK: 8, TokenType.SLASH: 8, TokenType.LSLASH: 8,
+}
+NOT_PRECEDENCE = 4
+
+# Commands that can appear between the items of a PRINT list
+PRINT_COMMANDS = frozenset({TokenType.SPC, TokenType.TAB})
+
 class BASParser:
     """
     A BASParser object keeps track of current token, checks if the code matches the grammar,
     and emits code along the way if an emitter has been set.
-    To resolve forward declarations (jump points), the parser does two passes. In the
-    first pass, the emitter doesn't really emit any code but this allows the parser
-    to construct the whole symbols table.
+    The source code is parsed in a single pass. Forward declarations (jump points)
+    are emitted as plain label names and resolved later by the assembler.
     """
+    __slots__ = (
+        'lexer', 'emitter', 'verbose', 'errors', 'cur_token', 'peek_token',
+        'symbols', 'symsearch', 'symadd', 'symnames', 'identsyms', 'srcinfo',
+        'strliterals', 'realliterals', 'cur_expr', 'expr_stack', 'block_stack', 'temp_vars',
+        'command_rules', 'function_rules', 'statement_rules'
+    )
+
     def __init__(self, lexer: BASLexer, emitter: SMEmitter, verbose: bool) -> None:
         self.lexer = lexer
         self.emitter = emitter
@@ -42,28 +98,80 @@ class BASParser:
         self.cur_token: Optional[Token] = None
         self.peek_token: Optional[Token] = None
         self.symbols = SymbolTable()
+        self.symsearch = self.symbols.search
+        self.symadd = self.symbols.add
+        # BASIC identifier -> (symbol name, forced type) already computed
+        self.symnames: Dict[str, Tuple[str, BASTypes]] = {}
+        # BASIC identifier -> symbol it already resolved to
+        self.identsyms: Dict[str, Symbol] = {}
+        # source line -> (file name, line number, code) used by errors and warnings
+        self.srcinfo: Dict[int, Tuple[str, int, str]] = {}
+        # literal text -> temporal variable holding that constant
+        self.strliterals: Dict[str, Symbol] = {}
+        self.realliterals: Dict[str, Symbol] = {}
         self.cur_expr = Expression()
         self.expr_stack: List[Expression] = []
         # start, limit, step, looplabel, endlabel
         self.block_stack: List[CodeBlock] = []
         self.temp_vars: int = 0
+        # token type -> rule for each supported command and function, keywords
+        # ending with $ are parsed by rules ending with S (CHR$ -> function_CHRS)
+        self.command_rules: Dict[TokenType, Callable[[], None]] = {}
+        self.function_rules: Dict[TokenType, Callable[[], None]] = {}
+        for tktype in TokenType:
+            command_rule = getattr(self, "command_" + tktype.name, None)
+            if command_rule is not None:
+                self.command_rules[tktype] = command_rule
+            function_rule = getattr(self, "function_" + tktype.name, None)
+            if function_rule is not None:
+                self.function_rules[tktype] = function_rule
+        # first token of a statement -> rule that parses it, keywords go straight
+        # to their command or function rule and unsupported ones to keyword()
+        self.statement_rules: Dict[TokenType, Callable[[], None]] = {TokenType.IDENT: self.assignment}
+        for tktype in TokenType:
+            if TokenType.TK_KEYWORDS < tktype < TokenType.TK_NUM_OPS:
+                keyword_rule = self.command_rules.get(tktype)
+                if keyword_rule is None:
+                    keyword_rule = self.function_rules.get(tktype, self.keyword)
+                self.statement_rules[tktype] = keyword_rule
 
     def abort(self, message: str) -> None:
         print(f"Fatal error: {message}")
         sys.exit(1)
     
+    def get_srcinfo(self, srcline: int) -> Tuple[str, int, str]:
+        """ File name, line number and code of a source line as shown in messages """
+        info = self.srcinfo.get(srcline)
+        if info is None:
+            filename, linenum, line = self.lexer.get_srccode(srcline)
+            info = (os.path.basename(filename), linenum, line.strip())
+            self.srcinfo[srcline] = info
+        return info
+
     def error(self, srcline: int, message: str, extrainfo: str = "") -> None:
         self.errors = self.errors + 1
-        filename, linenum, line = self.lexer.get_srccode(srcline)
-        filename = os.path.basename(filename)
-        print(f"Error in {filename}:{linenum}: {line.strip()} -> {message} {extrainfo}")
-        while not self.match_current(TokenType.NEWLINE):
+        filename, linenum, line = self.get_srcinfo(srcline)
+        print(f"Error in {filename}:{linenum}: {line} -> {message} {extrainfo}")
+        # skip the rest of the line, the lexer can do it without tokenizing it
+        assert self.cur_token is not None and self.peek_token is not None
+        tktype = self.cur_token.type
+        if tktype is T_NEWLINE or tktype is T_CODE_EOF:
+            return
+        tktype = self.peek_token.type
+        if tktype is T_NEWLINE or tktype is T_CODE_EOF:
             self.next_token()
+        else:
+            self.cur_token = self.lexer.skip_line()
+            self.peek_token = self.lexer.get_token()
+
+    def expr_error(self, srcline: int, message: str, extrainfo: str = "") -> None:
+        """ Drops the expression being parsed and reports the error """
+        self.cur_expr = Expression()
+        self.error(srcline, message, extrainfo)
 
     def warning(self, srcline: int, message: str, extrainfo: str = "") -> None:
-        filename, linenum, line = self.lexer.get_srccode(srcline)
-        filename = os.path.basename(filename)
-        print(f"Warning in {filename}:{linenum}: {line.strip()} -> {message} {extrainfo}")
+        filename, linenum, line = self.get_srcinfo(srcline)
+        print(f"Warning in {filename}:{linenum}: {line} -> {message} {extrainfo}")
 
     def get_curcode(self) -> str:
         assert self.cur_token is not None
@@ -76,12 +184,12 @@ class BASParser:
     def match_current(self, tktype: TokenType) -> bool:
         """Return true if the current token matches."""
         assert self.cur_token is not None
-        return tktype == self.cur_token.type
+        return tktype is self.cur_token.type
 
     def match_next(self, tktype: TokenType) -> bool:
         """Return true if the next token matches."""
         assert self.peek_token is not None
-        return tktype == self.peek_token.type
+        return tktype is self.peek_token.type
 
     def next_token(self) -> None:
         """Advances the current token."""
@@ -91,8 +199,10 @@ class BASParser:
     def next_instruction(self) -> None:
         """Advances the current token until it founds the end
         of the current instruction (ie ':' RETURN or End of File)."""
+        assert self.cur_token is not None
         while True:
-            if self.match_current(TokenType.COLON) or self.match_current(TokenType.NEWLINE) or self.match_current(TokenType.EOF):
+            tktype = self.cur_token.type
+            if tktype is TokenType.COLON or tktype is TokenType.NEWLINE or tktype is TokenType.EOF:
                 return
             self.next_token()
 
@@ -103,31 +213,29 @@ class BASParser:
 
     def symtab_name2type(self, symname: str) -> Tuple[str, BASTypes]:
         """ Lets enforce variable types """
-        forcedtype = BASTypes.NONE
-        symname = 'var_' + symname.lower()
-        if symname.endswith('$'):
-            symname = symname.replace('$', '_str')
-            forcedtype = BASTypes.STR
-        elif symname.endswith('!'):
-            symname = symname.replace('!', '_real')
-            forcedtype = BASTypes.REAL
-        elif symname.endswith('%'): 
-            symname = symname.replace('%', '_int')
-            forcedtype = BASTypes.INT
-        return symname, forcedtype
+        entry = self.symnames.get(symname)
+        if entry is None:
+            lowername = sys.intern('var_' + symname.lower())
+            suffix = SYMNAME_SUFFIXES.get(lowername[-1])
+            if suffix is None:
+                entry = (lowername, BASTypes.NONE)
+            else:
+                entry = (sys.intern(lowername[:-1] + suffix[0]), suffix[1])
+            self.symnames[symname] = entry
+        return entry
         
     def symtab_addlabel(self, symname: str, srcline: int) -> Optional[Symbol]:
-        if self.symbols.search(symname):
+        if self.symsearch(symname):
             self.error(srcline, ErrorCode.LEXISTS)
             return None
         else:
-            return self.symbols.add(symname, SymTypes.SYMLAB)
+            return self.symadd(symname, SymTypes.SYMLAB)
 
-    def symtab_addident(self, symname: str, srcline: int, expr: Expression) -> Optional[Symbol]:
-        symname, forcedtype = self.symtab_name2type(symname)
-        entry = self.symbols.search(symname)
+    def symtab_addident(self, token: Token, expr: Expression) -> Optional[Symbol]:
+        symname, forcedtype = self.symtab_name2type(token.text)
+        entry = self.symsearch(symname)
         if entry is None:
-            entry = self.symbols.add(symname, SymTypes.SYMVAR)
+            entry = self.symadd(symname, SymTypes.SYMVAR)
             # force type if it is included in variable name so
             # is_compatible will ensure it matches with expression type
             entry.valtype = forcedtype
@@ -135,17 +243,33 @@ class BASParser:
             entry.set_value(expr)
             return entry
         else:
-            self.error(srcline, ErrorCode.TYPE)
+            self.error(token.srcline, ErrorCode.TYPE)
             return None
 
-    def symtab_search(self, symname: str) -> Optional[Symbol]:
-        symname, _ = self.symtab_name2type(symname)
-        return self.symbols.search(symname)
+    def symtab_search(self, token: Token) -> Optional[Symbol]:
+        sym = self.identsyms.get(token.text)
+        if sym is None:
+            symname, _ = self.symtab_name2type(token.text)
+            sym = self.symsearch(symname)
+            if sym is not None:
+                # valid until symtab_newtmpvar replaces a symbol with the same name
+                self.identsyms[token.text] = sym
+        return sym
+
+    def symtab_tmpname(self, names: List[str], prefix: str) -> str:
+        """ Name of the next temporal symbol, built only once per number """
+        while len(names) <= self.temp_vars:
+            names.append(sys.intern(f"{prefix}{len(names):03d}"))
+        return names[self.temp_vars]
 
     def symtab_newtmpvar(self, expr: Expression) -> Optional[Symbol]:
-        sname = f"tmp{self.temp_vars:03d}"
-        sname, _ = self.symtab_name2type(sname)
-        entry = self.symbols.add(sname, SymTypes.SYMVAR)
+        # same name that symtab_name2type would give to "tmpNNN"
+        sname = self.symtab_tmpname(TMPVAR_NAMES, "var_tmp")
+        if self.symsearch(sname) is not None:
+            # a user variable called TMPNNN is replaced, so the identifiers
+            # that already resolved to it cannot keep the old symbol
+            self.identsyms.clear()
+        entry = self.symadd(sname, SymTypes.SYMVAR)
         if entry is not None:
             entry.set_value(expr)
             entry.temporal = True
@@ -153,7 +277,7 @@ class BASParser:
         return entry
 
     def symtab_newtmplabel(self, srcline: int) -> Optional[Symbol]:
-        sname = f"label_{self.temp_vars:03d}"
+        sname = self.symtab_tmpname(TMPLABEL_NAMES, "label_")
         entry = self.symtab_addlabel(sname, srcline)
         if entry is not None:
             entry.temporal = True
@@ -165,19 +289,21 @@ class BASParser:
         self.cur_expr = Expression()
 
     def pop_curexpr(self) -> None:
-        if len(self.expr_stack) > 0:
-            self.cur_expr = self.expr_stack[-1]
-            self.expr_stack.pop()
+        if self.expr_stack:
+            self.cur_expr = self.expr_stack.pop()
         else:
             self.abort("internal error processing expressions")
 
     def reset_curexpr(self) -> None:
+        # Expressions can be referenced by argument lists and symbols share
+        # their token list, so a new one is always created instead of reusing it
         self.cur_expr = Expression()
 
     def parse(self) -> None:
-        self.lexer.reset()
-        self.cur_token = self.lexer.get_token()
-        self.peek_token = self.lexer.get_token()
+        lexer = self.lexer
+        lexer.reset()
+        self.cur_token = lexer.get_token()
+        self.peek_token = lexer.get_token()
         self.temp_vars = 0
         self.errors = 0
         self.lines()
@@ -200,71 +326,77 @@ class BASParser:
         """<lines> ::= EOF | NEWLINE <lines> | <line> <lines>"""
         assert self.cur_token is not None
         # Parse all the statements in the program.
-        if self.match_current(TokenType.CODE_EOF):
-            # End of file
-            pass
-        elif self.match_current(TokenType.NEWLINE):
-            # Empty lines
-            self.next_token()
-            self.lines()
-        else:
-            self.line()
-            self.lines()
+        tktype = self.cur_token.type
+        while tktype is not T_CODE_EOF:
+            if tktype is T_NEWLINE:
+                # Empty lines
+                self.next_token()
+            else:
+                self.line()
+            assert self.cur_token is not None
+            tktype = self.cur_token.type
 
     def line(self) -> None:
         """ <line> := INTEGER NEWLINE | INTEGER <statements> NEWLINE"""
-        assert self.cur_token is not None
-        if self.match_current(TokenType.INTEGER):
-            self.emitter.remark(self.get_curcode())
-            self.emitter.label(self.get_linelabel(self.cur_token.text))
+        cur_token = self.cur_token
+        assert cur_token is not None
+        if cur_token.type is T_INTEGER:
+            self.emitter.srcline(self.get_curcode(), self.get_linelabel(cur_token.text))
             self.next_token()
-            if self.match_current(TokenType.NEWLINE):
+            assert self.cur_token is not None
+            if self.cur_token.type is T_NEWLINE:
                 # This was a full line remark (' or REM) removed by the lexer
                 self.next_token()
             else:
                 self.statements()
-                if self.match_current(TokenType.NEWLINE):
+                assert self.cur_token is not None
+                if self.cur_token.type is T_NEWLINE:
                     self.next_token()
                 else:
                     self.error(self.cur_token.srcline, ErrorCode.SYNTAX)
         else:
-            self.error(self.cur_token.srcline, ErrorCode.SYNTAX)
+            self.error(cur_token.srcline, ErrorCode.SYNTAX)
 
     def statements(self) -> None:
-         """ <statements>  ::= <statement> [':' <statements>] """
-         assert self.cur_token is not None
-         self.statement()
-         if (self.match_current(TokenType.COLON)):
-              self.next_token()
-              self.statements()
+        """ <statements>  ::= <statement> [':' <statement>]* """
+        assert self.cur_token is not None
+        self.statement()
+        while self.cur_token.type is T_COLON:
+            self.next_token()
+            self.statement()
 
     def statement(self) -> None:
-        """  <statement> = IDENT '=' <expression> | <keyword>"""
-        assert self.cur_token is not None
+        """  <statement> = <assignment> | <keyword>"""
+        cur_token = self.cur_token
+        assert cur_token is not None
         self.reset_curexpr()
-        if self.match_current(TokenType.IDENT):
-            symbol = self.cur_token
+        statement_rule = self.statement_rules.get(cur_token.type)
+        if statement_rule is None:
+            self.error(cur_token.srcline, ErrorCode.SYNTAX)
+        else:
+            statement_rule()
+
+    def assignment(self) -> None:
+        """  <assignment> = IDENT '=' <expression>"""
+        assert self.cur_token is not None
+        symbol = self.cur_token
+        self.next_token()
+        assert self.cur_token is not None
+        if self.cur_token.type is TokenType.EQ:
             self.next_token()
-            if self.match_current(TokenType.EQ):
-                self.next_token()
-                self.expression()
-                entry = self.symtab_addident(symbol.text, symbol.srcline, self.cur_expr)
-                if entry is not None:
-                    self.emitter.assign(entry.symbol, self.cur_expr)
-            else:
-                self.error(symbol.srcline, ErrorCode.SYNTAX)
-        elif self.cur_token.is_keyword():
-            self.keyword()
+            self.expression()
+            entry = self.symtab_addident(symbol, self.cur_expr)
+            if entry is not None:
+                self.emitter.assign(entry.symbol, self.cur_expr)
         else:
-            self.error(self.cur_token.srcline, ErrorCode.SYNTAX)
+            self.error(symbol.srcline, ErrorCode.SYNTAX)
 
     def keyword(self) -> None:
         """ <keyword> := COMMAND | FUNCTION """
         assert self.cur_token is not None
-        fname = self.cur_token.text.replace('$', 'S').upper()
-        keyword_rule = getattr(self, "command_" + fname, None)
+        keyword_rule = self.command_rules.get(self.cur_token.type)
         if keyword_rule is None:
-            keyword_rule = getattr(self, "function_" + fname, None)
+            keyword_rule = self.function_rules.get(self.cur_token.type)
         if keyword_rule is None:
             self.error(self.cur_token.srcline, ErrorCode.NOKEYW, ": " + self.cur_token.text)
         else:
@@ -282,7 +414,7 @@ class BASParser:
             self.error(self.cur_token.srcline, ErrorCode.SYNTAX)
             return
         self.next_token()
-        sym = self.symtab_newtmpvar(Expression.int('0'))
+        sym = self.symtab_newtmpvar(EXPR_INT_0)
         if sym is not None:
             args: List[Expression] = []
             self.push_curexpr()
@@ -336,7 +468,7 @@ class BASParser:
             self.error(self.cur_token.srcline, ErrorCode.SYNTAX)
             return
         self.next_token()
-        sym = self.symtab_newtmpvar(Expression.string(""))
+        sym = self.symtab_newtmpvar(EXPR_STR_EMPTY)
         if sym is not None:
             args: List[Expression] = []
             self.push_curexpr()
@@ -392,7 +524,7 @@ class BASParser:
             if self.match_current(TokenType.EQ):
                 self.next_token()
                 self.arg_int()
-                variant = self.symtab_addident(symbol.text, symbol.srcline, self.cur_expr)
+                variant = self.symtab_addident(symbol, self.cur_expr)
                 assert variant is not None
                 self.emitter.assign(variant.symbol, self.cur_expr)
                 self.reset_curexpr()
@@ -465,14 +597,14 @@ class BASParser:
             self.error(self.cur_token.srcline, ErrorCode.SYNTAX)
             return
         self.next_token()
-        sym = self.symtab_newtmpvar(Expression.string(""))
+        sym = self.symtab_newtmpvar(EXPR_STR_EMPTY)
         if sym is not None:
             args: List[Expression] = []
             self.push_curexpr()
             self.arg_int()
             args.append(self.cur_expr)
             self.pop_curexpr()
-            digits = Expression.int('4')
+            digits = EXPR_INT_4
             if self.match_current(TokenType.COMMA):
                 self.next_token()
                 self.push_curexpr()
@@ -544,7 +676,7 @@ class BASParser:
         # no need of pushing current expression as this function has not
         # parameters
         assert self.cur_token is not None
-        sym = self.symtab_newtmpvar(Expression.string(""))
+        sym = self.symtab_newtmpvar(EXPR_STR_EMPTY)
         if sym is not None:
             self.emitter.rtcall('INKEYS', [], sym)
             sym.inc_writes()
@@ -623,7 +755,7 @@ class BASParser:
             self.emitter.next(start, limit, step, cblock.startlabel, cblock.endlabel)
             if self.match_current(TokenType.IDENT):
                 assert self.cur_token is not None
-                entry = self.symtab_search(self.cur_token.text)
+                entry = self.symtab_search(self.cur_token)
                 if not entry or entry.symbol != start.symbol:
                     self.error(self.cur_token.srcline, ErrorCode.SYNTAX)
                     self.block_stack.append(cblock)
@@ -684,7 +816,7 @@ class BASParser:
             self.error(self.cur_token.srcline, ErrorCode.SYNTAX)
             return
         self.next_token()
-        sym = self.symtab_newtmpvar(Expression.int('0'))
+        sym = self.symtab_newtmpvar(EXPR_INT_0)
         if sym is not None:
             args: List[Expression] = []
             self.push_curexpr()
@@ -867,7 +999,7 @@ class BASParser:
         # assume 0
         assert self.cur_token is not None
         line = self.cur_token.srcline
-        channel = [Expression.int('0')]
+        channel = [EXPR_INT_0]
         if self.match_current(TokenType.CHANNEL):
             self.push_curexpr()
             self.next_token()
@@ -883,9 +1015,8 @@ class BASParser:
         """ <arg_print_list> := <expresion>[(;|,)<expresion>*]"""
         assert self.cur_token is not None
         line = self.cur_token.srcline
-        allowedcmd = [TokenType.SPC, TokenType.TAB]
-        while self.cur_token.type in allowedcmd:
-            cmd_rule = getattr(self, "command_" + self.cur_token.text, None)
+        while self.cur_token.type in PRINT_COMMANDS:
+            cmd_rule = self.command_rules.get(self.cur_token.type)
             assert cmd_rule is not None
             cmd_rule()
         self.expression()
@@ -900,22 +1031,25 @@ class BASParser:
                 self.error(line, ErrorCode.SYNTAX)
                 return
             self.reset_curexpr()
-            if self.match_current(TokenType.SEMICOLON):
+            tktype = self.cur_token.type
+            if tktype is TokenType.SEMICOLON:
                 self.next_token()
-                if self.match_current(TokenType.NEWLINE) or self.match_current(TokenType.COLON):
+                tktype = self.cur_token.type
+                if tktype is TokenType.NEWLINE or tktype is TokenType.COLON:
                     return
-            elif self.match_current(TokenType.COMMA):
-                self.emitter.rtcall('PRINT_SPC', [Expression.int('4')])
+            elif tktype is TokenType.COMMA:
+                self.emitter.rtcall('PRINT_SPC', [EXPR_INT_4])
                 self.next_token()
-                if self.match_current(TokenType.NEWLINE) or self.match_current(TokenType.COLON):
+                tktype = self.cur_token.type
+                if tktype is TokenType.NEWLINE or tktype is TokenType.COLON:
                     return
-            elif self.match_current(TokenType.NEWLINE):
+            elif tktype is TokenType.NEWLINE:
                 break
-            while self.cur_token.type in allowedcmd:
-                cmd_rule = getattr(self, "command_" + self.cur_token.text, None)
+            while self.cur_token.type in PRINT_COMMANDS:
+                cmd_rule = self.command_rules.get(self.cur_token.type)
                 assert cmd_rule is not None
                 cmd_rule()
-            self.expression()    
+            self.expression()
         self.emitter.rtcall('PRINT_LN')
     
     #
@@ -923,182 +1057,147 @@ class BASParser:
     #
 
     def expression(self) -> None:
-        """ <expression> ::= <or_term> [XOR <expression>] """
+        """ <expression> ::= <or_term> [XOR <or_term>]* """
         assert self.cur_token is not None
         line = self.cur_token.srcline
-        self.or_term()
-        if self.match_current(TokenType.XOR):
-            op = self.cur_token
-            self.next_token()
-            self.expression()
-            self.cur_expr.pushop(op)
+        self.binary_term(1)
         try:
             if not self.cur_expr.check_types():
-                self.reset_curexpr()
-                self.error(line, ErrorCode.TYPE)
+                self.expr_error(line, ErrorCode.TYPE)
         except Exception:
             # bad formed expression
-            self.reset_curexpr()
-            self.error(line, ErrorCode.SYNTAX)
-
-    def or_term(self) -> None:
-        """<or_term> ::= <and_term> [OR <or_term>]"""
-        assert self.cur_token is not None
-        self.and_term()
-        if self.match_current(TokenType.OR):
-            op = self.cur_token
-            self.next_token()
-            self.or_term()
-            self.cur_expr.pushop(op)
-
-    def and_term(self) -> None:
-        """<and_term> ::= <not_term> [AND <and_term>]"""
-        assert self.cur_token is not None
-        self.not_term()
-        if self.match_current(TokenType.AND):
-            op = self.cur_token
-            self.next_token()
-            self.and_term()
-            self.cur_expr.pushop(op)
+            self.expr_error(line, ErrorCode.SYNTAX)
 
-    def not_term(self) -> None:
-        """<not_term> ::= [NOT] <compare_term>"""
+    def binary_term(self, minprec: int) -> None:
+        """
+        Parses the binary operator levels of the grammar by precedence climbing:
+        <or_term>      ::= <and_term> [OR <and_term>]*
+        <and_term>     ::= <not_term> [AND <not_term>]*
+        <not_term>     ::= [NOT] <compare_term>
+        <compare_term> ::= <add_term> [('=','<>'.'>','<','>=','<=') <add_term>]*
+        <add_term>     ::= <mod_term> [('+'|'-') <mod_term>]*
+        <mod_term>     ::= <mult_term> [MOD <mult_term>]*
+        <mult_term>    ::= <negate_term> [('*'|'/'|'\\') <negate_term>]*
+        Only operators with a precedence of at least minprec are consumed, so
+        each operand costs one call per level actually used instead of one per
+        grammar rule.
+        """
         assert self.cur_token is not None
-        if self.match_current(TokenType.NOT):
-            op = self.cur_token
+        op = self.cur_token
+        if op.type is T_NOT and minprec <= NOT_PRECEDENCE:
             self.next_token()
-            self.compare_term()
+            self.binary_term(NOT_PRECEDENCE + 1)
             self.cur_expr.pushop(op)
         else:
-            self.compare_term()
-
-    def compare_term(self) -> None:
-        """<compare_term> ::= <add_term> [('=','<>'.'>','<','>=','<=')  <compare_term>]"""
-        assert self.cur_token is not None
-        self.add_term()
-        if self.cur_token.is_logic_op():
-            op = self.cur_token
-            self.next_token()
-            self.compare_term()
-            self.cur_expr.pushop(op)
-
-    def add_term(self) -> None:
-        """<add_term> ::= <mod_term> [('+'|'-') <add_term>]"""
-        assert self.cur_token is not None
-        self.mod_term()
-        if self.match_current(TokenType.PLUS) or self.match_current(TokenType.MINUS):
-            op = self.cur_token
+            self.negate_term()
+        op = self.cur_token
+        prec = BINARY_OPS.get(op.type, 0)
+        while prec >= minprec:
             self.next_token()
-            self.add_term()
+            self.binary_term(prec + 1)
             self.cur_expr.pushop(op)
-
-    def mod_term(self) -> None:
-        """<mod_term> ::= <mult_term> [MOD <mod_term>]"""
-        assert self.cur_token is not None
-        self.mult_term()
-        if self.match_current(TokenType.MOD):
             op = self.cur_token
-            self.next_token()
-            self.mod_term()
-            self.cur_expr.pushop(op)
-
-    def mult_term(self) -> None:
-        """<mult_term> ::= <negate_term> [('*'|'/'|'\\' <mult_term>] """
-        assert self.cur_token is not None
-        self.negate_term()
-        if self.match_current(TokenType.SLASH) or self.match_current(TokenType.LSLASH) or self.match_current(TokenType.ASTERISK):
-            op = self.cur_token
-            self.next_token()
-            self.mult_term()
-            self.cur_expr.pushop(op)
+            prec = BINARY_OPS.get(op.type, 0)
 
     def negate_term(self) -> None:
         """<negate_term> ::= ['-'] <sub_term> """
         assert self.cur_token is not None
-        if self.match_current(TokenType.MINUS):
-            op = self.cur_token
+        op = self.cur_token
+        if op.type is T_MINUS:
             self.next_token()
             self.sub_term()
-            self.cur_expr.pushop(Token('NEG', TokenType.NEG, op.srcline))
+            self.cur_expr.pushop(Token('NEG', T_NEG, op.srcline))
         else:
             self.sub_term()
 
     def sub_term(self) -> None:
         """ <sub_term> ::= '(' <expression> ')' | <factor> """
         assert self.cur_token is not None
-        if self.match_current(TokenType.LPAR):
-            partoken = self.cur_token
+        partoken = self.cur_token
+        if partoken.type is T_LPAR:
             self.next_token()
             self.expression()
-            if self.match_current(TokenType.RPAR):
+            if self.cur_token.type is T_RPAR:
                 self.next_token()
             else:
-                self.reset_curexpr()
-                self.error(partoken.srcline, ErrorCode.SYNTAX)
+                self.expr_error(partoken.srcline, ErrorCode.SYNTAX)
         else:
             self.factor()
 
     def factor(self) -> None:
         """<factor> ::= <ident_factor> | <int_factor> | <real_factor> | <str_factor> | <fun_call>"""
         assert self.cur_token is not None
-        if self.match_current(TokenType.IDENT):
-            self.ident_factor()
-        elif self.match_current(TokenType.INTEGER):
+        # branches ordered by how often each token starts a factor in
+        # the bundled examples: integer literals, strings, variables
+        tktype = self.cur_token.type
+        if tktype is T_INTEGER:
             self.int_factor()
-        elif self.match_current(TokenType.REAL):
-            self.real_factor()
-        elif self.match_current(TokenType.STRING):
+        elif tktype is T_STRING:
             self.str_factor()
+        elif tktype is T_IDENT:
+            self.ident_factor()
+        elif tktype is T_REAL:
+            self.real_factor()
         else:
             self.fun_call()
 
-    def ident_factor(self):
+    def ident_factor(self) -> None:
         """ <ident_factor> := IDENT """
         assert self.cur_token is not None
-        sym = self.symtab_search(self.cur_token.text)
+        cur_token = self.cur_token
+        sym = self.symtab_search(cur_token)
         if sym is not None:
             # store the token in the expression with the name keep in the
-            # symbols table
-            token = Token(sym.symbol, TokenType.IDENT, self.cur_token.srcline)
-            self.cur_expr.pushval(token, sym.valtype)
+            # symbols table, the lexer token is not used anymore so it is
+            # renamed in place instead of building a new one
+            cur_token.text = sym.symbol
+            self.cur_expr.pushval(cur_token, sym.valtype)
             sym.inc_reads()
             self.next_token()
         else:
-            self.reset_curexpr()
-            self.error(self.cur_token.srcline, ErrorCode.NOIDENT)
+            self.expr_error(cur_token.srcline, ErrorCode.NOIDENT)
 
-    def int_factor(self):
+    def int_factor(self) -> None:
         """ <int_factor> := NUMBER """
         assert self.cur_token is not None
         self.cur_expr.pushval(self.cur_token, BASTypes.INT)
         self.next_token()
 
-    def real_factor(self):
+    def real_factor(self) -> None:
         """ <real_factor> := REAL """
-        realexpr = Expression()
-        realexpr.pushval(self.cur_token, BASTypes.REAL)
-        sym = self.symtab_newtmpvar(realexpr)
+        assert self.cur_token is not None
+        # the same literal always reuses the same constant
+        sym = self.realliterals.get(self.cur_token.text)
+        if sym is None:
+            realexpr = Expression()
+            realexpr.pushval(self.cur_token, BASTypes.REAL)
+            sym = self.symtab_newtmpvar(realexpr)
+            if sym is not None:
+                self.realliterals[self.cur_token.text] = sym
         if sym is not None:
-            self.cur_expr.pushval(Token(sym.symbol, TokenType.IDENT, self.cur_token.srcline), BASTypes.REAL)
+            self.cur_expr.pushval(Token(sym.symbol, T_IDENT, self.cur_token.srcline), BASTypes.REAL)
             self.next_token()
 
-    def str_factor(self):
+    def str_factor(self) -> None:
         """ <str_factor> := STRING """
         assert self.cur_token is not None
-        strexpr = Expression()
-        strexpr.pushval(self.cur_token, BASTypes.STR)
-        sym = self.symtab_newtmpvar(strexpr)
+        # the same literal always reuses the same constant
+        sym = self.strliterals.get(self.cur_token.text)
+        if sym is None:
+            strexpr = Expression()
+            strexpr.pushval(self.cur_token, BASTypes.STR)
+            sym = self.symtab_newtmpvar(strexpr)
+            if sym is not None:
+                self.strliterals[self.cur_token.text] = sym
         if sym is not None:
-            self.cur_expr.pushval(Token(sym.symbol, TokenType.IDENT, self.cur_token.srcline), BASTypes.STR)
+            self.cur_expr.pushval(Token(sym.symbol, T_IDENT, self.cur_token.srcline), BASTypes.STR)
             self.next_token()
 
-    def fun_call(self):
+    def fun_call(self) -> None:
         """ <fun_call> := <function_NAME> """
         assert self.cur_token is not None
-        fname = self.cur_token.text.replace('$', 'S').upper()
-        function_rule = getattr(self, "function_" + fname, None)
+        function_rule = self.function_rules.get(self.cur_token.type)
         if function_rule is None:
-            self.reset_curexpr()
-            self.error(self.cur_token.srcline, f"function {self.cur_token.text} is not supported yet")
+            self.expr_error(self.cur_token.srcline, f"function {self.cur_token.text} is not supported yet")
         else:
             function_rule()
\ No newline at end of file
@@ -17,12 +17,17 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
 
 import sys
 import os
-import re
 import argparse
-from typing import List, Any, Tuple
+from typing import List, Any, Tuple, Dict
 
 class BASPreprocessor:
 
+    def __init__(self) -> None:
+        # real path -> code lines of each file already included
+        self.included: Dict[str, List[Tuple[int, str]]] = {}
+        # real paths of the files being read, the last one is the current file
+        self.reading: List[str] = []
+
     def abort(self, message: str, file: str = "", iline: int = -1, sline: str= "") -> None:
         if file == "":
             print(f"Fatal error: {message}")
@@ -30,37 +35,58 @@ class BASPreprocessor:
             print(f"Fatal error in {file}:{iline}: {sline.strip()} -> {message}")
         sys.exit(1)
 
-    def _insert_file(self, basedir, iline: int, line: str, lines: List[Tuple[str, int, str]]) -> Any:
-        relpath = re.search(r'(?<=")(.*)(?=")', line)
-        if relpath is None:
+    def _code_lines(self, filecontent: List[str]) -> List[Tuple[int, str]]:
+        """ Line number and stripped text of the non empty lines of a file """
+        stripped = [(i, line.strip()) for i, line in enumerate(filecontent, 1)]
+        return [(i, line) for i, line in stripped if line != ""]
+
+    def _insert_file(self, basedir, srcline: Tuple[str, int, str], line: str) -> Any:
+        """ Reads the file included by an INCBAS line and returns its lines """
+        filename, fileline, orgline = srcline
+        # path between the first and the last double quotes
+        start = line.find('"')
+        end = line.rfind('"')
+        if start == end:
             self.abort(
                 f"the file to be included in '{line}' must be specified between double quotes",
-                lines[iline][0],
-                lines[iline][1],
-                lines[iline][2]
+                filename,
+                fileline,
+                orgline
             )
         else:
-            if ":" in line.replace(relpath.group(0), ''):
+            relpath = line[start+1:end]
+            if ":" in line[:start] or ":" in line[end+1:]:
                 # colon outside of quotes
                 self.abort(
                     "lines with INCBAS keyword cannot include other commands in the same line",
-                    lines[iline][0],
-                    lines[iline][1],
-                    lines[iline][2]
+                    filename,
+                    fileline,
+                    orgline
                 )
-            infile = os.path.join(basedir, relpath.group(0))
+            infile = os.path.join(basedir, relpath)
             try:
                 print("Including BAS file", infile)
-                with open(infile, 'r') as f:
-                    filecontent = f.readlines()
-                    newlines = [(infile, i, line) for i, line in enumerate(filecontent)]
-                    return lines[0:iline+1] + newlines + lines[iline+1:]
+                realpath = os.path.realpath(infile)
+                if realpath in self.reading:
+                    self.abort(
+                        f"recursive INCBAS, file {relpath} is already being included",
+                        filename,
+                        fileline,
+                        orgline
+                    )
+                self.reading.append(realpath)
+                codelines = self.included.get(realpath)
+                if codelines is None:
+                    with open(infile, 'r') as f:
+                        codelines = self._code_lines(f.read().splitlines())
+                    self.included[realpath] = codelines
+                return ((infile, i, line) for i, line in codelines)
             except IOError:
                 self.abort(
-                    f"cannot read included file {relpath.group(0)}",
-                    lines[iline][0],
-                    lines[iline][1],
-                    lines[iline][2]
+                    f"cannot read included file {relpath}",
+                    filename,
+                    fileline,
+                    orgline
                 )
 
     def _parse_input(self, inputfile: str, increment: int) -> Any:
@@ -68,22 +94,31 @@ class BASPreprocessor:
         autonum = increment
         try:
             with open(inputfile, 'r') as f:
-                filecontent = f.readlines()
-                srclines = [(inputfile, i+1, line) for i, line in enumerate(filecontent)]
-                srcline = 0
-                while srcline < len(srclines):
-                    filename, fileline, line = srclines[srcline]
-                    line = line.strip()
-                    if "INCBAS " == line[0:7].upper():
+                content = f.read()
+                codelines = self._code_lines(content.splitlines())
+                if "INCBAS " not in content.upper():
+                    # no included files, so all the lines can be numbered at once
+                    numbers = range(increment, increment * (len(codelines) + 1), increment)
+                    return [(inputfile, i, f"{n} {line}\n") for n, (i, line) in zip(numbers, codelines)]
+                srclines = ((inputfile, i, line) for i, line in codelines)
+                # stack of files being read, an included file is pushed on top of
+                # the one including it and reading resumes there once it ends
+                sources = [srclines]
+                self.reading = [os.path.realpath(inputfile)]
+                while sources:
+                    srcline = next(sources[-1], None)
+                    if srcline is None:
+                        sources.pop()
+                        self.reading.pop()
+                        continue
+                    filename, fileline, line = srcline
+                    if line[0] in "Ii" and line[0:7].upper() == "INCBAS ":
                         # insert content from another BAS file
                         basedir = os.path.dirname(inputfile)
-                        srclines = self._insert_file(basedir, srcline, line, srclines)
-                        srcline = srcline + 1
-                    elif line != "":
-                        line = str(autonum) + ' ' + line
-                        outlines.append((filename, fileline, line + '\n'))
+                        sources.append(self._insert_file(basedir, srcline, line))
+                    else:
+                        outlines.append((filename, fileline, f"{autonum} {line}\n"))
                         autonum = autonum + increment
-                    srcline = srcline + 1
             return outlines
         except IOError:
             self.abort(f"couldn't read input file {input}")
@@ -91,7 +126,7 @@ class BASPreprocessor:
     def save_output(self, output: str, code: List[str]) -> Any:
         try:
             with open(output, 'w') as f:
-                f.writelines(code)
+                f.write(''.join(code))
             print(f"Writting preprocessed file {output}")
             return True
         except IOError:
@@ -15,49 +15,50 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
 """
 
+import sys
 import enum
-from typing import Optional, List, Tuple, Dict, Union, Type
+from typing import Optional, List, Tuple, Dict, Union, Type, Final, Iterable
 
 class ErrorCode:
-    NEXT    = "Unexpected NEXT"
-    RESUME  = "Unexpected RESUME"
-    RETURN  = "Unexpected RETURN"
-    WEND    = "Unexpected WEND"
-    THEN    = "Unexpected THEN"
-    NONEXT  = "NEXT missing"
-    NOWEND  = "WEND missing"
-    NORESUME= "RESUME missing"
-    NOLINE  = "Line does not exist"
-    NOIDENT = "Undeclared indentifier"
-    LINELEN = "Line too long"
-    NOOP    = "Operand missing"
-    SYNTAX  = "Syntax Error"
-    UNKNOWN = "Unknown command"
-    DEFFN   = "Unknown user function"
-    TYPE    = "Type mismatch"
-    DIVZERO = "Division by zero"
-    STRFULL = "String space full"
-    STRLEN  = "String too long"
-    COMPLEX = "String expression too complex"
-    OUTRANGE= "Subscript out of range"
-    ARRAYDIM= "Array already dimensioned"
-    DATAEX  = "DATA exhausted"
-    ARGUMENT= "improper argument"
-    NOARG   = "missing argument"
-    OVERFLOW= "Overflow"
-    MEMFULL = "Memory full"
-    INVDIR  = "Invalid direct command"
-    DIRECT  = "Direct command found"
-    CONTINUE= "Cannot CONTinue"
-    EOFMET  = "EOF met"
-    FILETYPE= "File type error"
-    FILEOPEN= "File already open"
-    NOFILE  = "File not open"
-    BROKEN  = "Broken in"
-    NOKEYW  = "Keyword not implemented"
-    LEXISTS = "Label already defined"
+    NEXT:     Final = "Unexpected NEXT"
+    RESUME:   Final = "Unexpected RESUME"
+    RETURN:   Final = "Unexpected RETURN"
+    WEND:     Final = "Unexpected WEND"
+    THEN:     Final = "Unexpected THEN"
+    NONEXT:   Final = "NEXT missing"
+    NOWEND:   Final = "WEND missing"
+    NORESUME: Final = "RESUME missing"
+    NOLINE:   Final = "Line does not exist"
+    NOIDENT:  Final = "Undeclared indentifier"
+    LINELEN:  Final = "Line too long"
+    NOOP:     Final = "Operand missing"
+    SYNTAX:   Final = "Syntax Error"
+    UNKNOWN:  Final = "Unknown command"
+    DEFFN:    Final = "Unknown user function"
+    TYPE:     Final = "Type mismatch"
+    DIVZERO:  Final = "Division by zero"
+    STRFULL:  Final = "String space full"
+    STRLEN:   Final = "String too long"
+    COMPLEX:  Final = "String expression too complex"
+    OUTRANGE: Final = "Subscript out of range"
+    ARRAYDIM: Final = "Array already dimensioned"
+    DATAEX:   Final = "DATA exhausted"
+    ARGUMENT: Final = "improper argument"
+    NOARG:    Final = "missing argument"
+    OVERFLOW: Final = "Overflow"
+    MEMFULL:  Final = "Memory full"
+    INVDIR:   Final = "Invalid direct command"
+    DIRECT:   Final = "Direct command found"
+    CONTINUE: Final = "Cannot CONTinue"
+    EOFMET:   Final = "EOF met"
+    FILETYPE: Final = "File type error"
+    FILEOPEN: Final = "File already open"
+    NOFILE:   Final = "File not open"
+    BROKEN:   Final = "Broken in"
+    NOKEYW:   Final = "Keyword not implemented"
+    LEXISTS:  Final = "Label already defined"
     
-class TokenType(enum.Enum):
+class TokenType(enum.IntEnum):
     """
     Enum for all supported tokens.
     """
@@ -279,10 +280,27 @@ class TokenType(enum.Enum):
     CODE_EOF = 704
     NEWLINE = 705
 
+# Keyword text -> token type, keywords ending with $ use S instead (CHR$ -> CHRS).
+# Relies on all keyword enum values being between [ABS : TK_NUM_OPS]
+KEYWORDS = {
+    tktype.name: tktype for tktype in TokenType
+    if TokenType.ABS < tktype < TokenType.TK_NUM_OPS
+}
+
+# Text of the numerical operators
+NUM_OPS = frozenset({'+', '-', '*', '/', '\\', 'MOD'})
+
+# Comparison operators, they produce an INT (boolean) result
+LOGIC_OPS = frozenset({
+    TokenType.EQ, TokenType.NOTEQ, TokenType.GT, TokenType.LT, TokenType.GTEQ, TokenType.LTEQ
+})
+
 class Token:   
     """
     This class helps to store the original text and the type of a token.
     """
+    __slots__ = ('text', 'type', 'srcline', 'srcpos')
+
     def __init__(self, tktext: str, tktype: TokenType, srcline: int) -> None:
         self.text = tktext      # The token's actual text. Used for identifiers, strings, and numbers.
         self.type = tktype      # The TokenType that this token is classified as.
@@ -292,42 +310,39 @@ class Token:
     @staticmethod
     def get_keyword(tktext: str) -> Optional[TokenType]:
         if tktext.endswith('$'): tktext = tktext[:-1] + 'S'
-        for tktype in TokenType:
-            # Relies on all keyword enum values being between [ABS : TK_NUM_OPS]
-            if tktype.name == tktext and tktype.value > TokenType.ABS.value and tktype.value < TokenType.TK_NUM_OPS.value:
-                return tktype
-        return None
+        return KEYWORDS.get(tktext)
 
     def is_keyword(self) -> bool:
-        # Check if the token is in the list of keywords.
-        return Token.get_keyword(self.text) != None
+        # Check if the token is in the list of keywords. The lexer already
+        # classified it, so the type tells it without looking up the text
+        return TokenType.ABS < self.type < TokenType.TK_NUM_OPS
 
     def is_num_op(self) -> bool:
         # Check if the token is in the list of numerical operations.
-        return self.text in ['+','-','*','/','\\','MOD']
+        return self.text in NUM_OPS
 
     def is_logic_op(self) -> bool:
         # Check if the token is in the list of logical operations.
-        return self.text in ['=','<>','>','<','>=','<=']
+        return self.type in LOGIC_OPS
 
     def is_ident(self) -> bool:
         # Check if the token is an identifier
-        return self.type == TokenType.IDENT
+        return self.type is TokenType.IDENT
     
     def is_str(self) -> bool:
         # Check if the token is a string literal
-        return self.type == TokenType.STRING
+        return self.type is TokenType.STRING
     
     def is_int(self) -> bool:
         # Check if the token is an integer literal
-        return self.type == TokenType.INTEGER
+        return self.type is TokenType.INTEGER
     
     def is_real(self) -> bool:
         # Check if the token is a real literal
-        return self.type == TokenType.REAL
+        return self.type is TokenType.REAL
 
     def __str__(self) -> str:
-        return f"({self.text},{self.type},{self.srcline})"
+        return f"({self.text},{self.type.name},{self.srcline})"
 
 class BASTypes(enum.Enum):
     INT     = 0
@@ -336,97 +351,121 @@ class BASTypes(enum.Enum):
     VOID    = 3
     NONE    = 4
 
+# Operator texts checked by Expression.check_types: numeric operators and
+# operators that compare their operands
+ARITH_OPS = frozenset({'-', '*', '/', '\\', '%'})
+COMPARE_OPS = frozenset({'=', '>', '<', '<>', '>=', '<=', 'AND', 'OR'})
+
+# Token types pushed as values (operands) in an expression
+VALUE_TYPES = frozenset({TokenType.INTEGER, TokenType.REAL, TokenType.STRING, TokenType.IDENT})
+
 class Expression:
+    """
+    Expression in postfix order stored as two parallel lists: the tokens
+    and the type of each one (operators get theirs from check_types).
+    """
+    __slots__ = ('tokens', 'types', 'restype')
 
     def __init__(self) -> None:
         self.reset()
 
     def reset(self) -> None:
-        self.expr: List[Tuple[Token, BASTypes]] = []
+        self.tokens: List[Token] = []
+        self.types: List[BASTypes] = []
         self.restype: BASTypes = BASTypes.NONE  # Final result type
 
     def is_empty(self) -> bool:
-        return len(self.expr) == 0
+        return len(self.tokens) == 0
 
     def is_complex(self) -> bool:
-        return len(self.expr) > 1
+        return len(self.tokens) > 1
 
     def is_simple(self) -> bool:
-        return len(self.expr) == 1
+        return len(self.tokens) == 1
 
     def is_int_result(self) -> bool:
-        return self.restype.value == BASTypes.INT.value
+        return self.restype is BASTypes.INT
 
     def is_real_result(self) -> bool:
-        return self.restype.value == BASTypes.REAL.value
+        return self.restype is BASTypes.REAL
 
     def is_str_result(self) -> bool:
-        return self.restype.value == BASTypes.STR.value
+        return self.restype is BASTypes.STR
 
     def is_void_result(self) -> bool:
-        return self.restype.value == BASTypes.VOID.value
+        return self.restype is BASTypes.VOID
     
     def is_none_result(self) -> bool:
-        return self.restype.value == BASTypes.NONE.value
+        return self.restype is BASTypes.NONE
     
     def is_compatible(self, bastype: BASTypes) -> bool:
-        return self.restype == bastype
+        return self.restype is bastype
 
     def pushval(self, symbol: Token, bastype: BASTypes) -> None:
-        if self.restype == BASTypes.NONE:
+        if self.restype is BASTypes.NONE:
             self.restype = bastype
-        self.expr.append((symbol, bastype))
+        self.tokens.append(symbol)
+        self.types.append(bastype)
     
     def pushop(self, symbol: Token) -> None:
         # operators are added without type because checktypes will do it
         # after the expression is parsed to calculate it correctly
-        self.expr.append((symbol, BASTypes.NONE))
+        self.tokens.append(symbol)
+        self.types.append(BASTypes.NONE)
 
     def check_types(self) -> bool:
+        types = self.types
+        if len(types) == 1 and self.tokens[0].type in VALUE_TYPES:
+            # most expressions are a single value: nothing to check
+            self.restype = types[0]
+            return True
         typestack: List[BASTypes] = []
-        for i, (token,bastype) in enumerate(self.expr):
-            if token.type not in [TokenType.INTEGER, TokenType.REAL, TokenType.STRING, TokenType.IDENT]:
-                top1 = typestack.pop()
-                if token.text in ['-','*','/','\\','%']:
+        pop = typestack.pop
+        push = typestack.append
+        for i, token in enumerate(self.tokens):
+            bastype = types[i]
+            if token.type not in VALUE_TYPES:
+                top1 = pop()
+                text = token.text
+                if text in ARITH_OPS:
                     # operants over numeric types (integers or reals)
-                    top2 = typestack.pop()
-                    if top1 != top2 or top1 == BASTypes.STR:
+                    top2 = pop()
+                    if top1 is not top2 or top1 is BASTypes.STR:
                         return False
-                    self.expr[i] = (token, top1)
+                    types[i] = top1
                     bastype = top1
-                elif token.text == '+':
+                elif text == '+':
                     # supports strings too as it means concat
-                    top2 = typestack.pop()
-                    if top1 != top2:
+                    top2 = pop()
+                    if top1 is not top2:
                         return False
-                    self.expr[i] = (token, top1)
+                    types[i] = top1
                     bastype = top1
-                elif token.text in ['=','>','<','<>','>=','<=','AND','OR']:
+                elif text in COMPARE_OPS:
                     # logic operations support strings, reals and integers but
                     # the result is always integer (boolean) so we store the
                     # type of the operands but stack INT for the test purposes
-                    top2 = typestack.pop()
-                    if top1 != top2:
+                    top2 = pop()
+                    if top1 is not top2:
                         return False
-                    self.expr[i] = (token, top1)
+                    types[i] = top1
                     bastype = BASTypes.INT
-                elif token.text == 'XOR':
+                elif text == 'XOR':
                     # this works only with integers
-                    top2 = typestack.pop()
-                    if top1 != top2 or top1 != BASTypes.INT:
+                    top2 = pop()
+                    if top1 is not top2 or top1 is not BASTypes.INT:
                         return False
-                    self.expr[i] = (token, BASTypes.INT)
+                    types[i] = BASTypes.INT
                     bastype = BASTypes.INT
                 else:
                     # This is one factor operation like NEG or AT
                     # all of them produce INT results right now
-                    bastype = BASTypes.INT
-                    if token.type != TokenType.AT and top1 != BASTypes.INT:
+                    if token.type is not TokenType.AT and top1 is not BASTypes.INT:
                         return False
-                    self.expr[i] = (token, BASTypes.INT)
+                    types[i] = BASTypes.INT
                     bastype = BASTypes.INT
 
-            typestack.append(bastype)
+            push(bastype)
 
         if len(typestack) == 1:
             self.restype = typestack[0]
@@ -434,28 +473,25 @@ class Expression:
         return False
 
     def __str__(self) -> str:
-        text = "["
-        for (token, type) in self.expr:
-            text = text + f"({token.text},{type})"
-        text = text + "]"
-        return text
+        items = ''.join([f"({token.text},{type})" for token, type in zip(self.tokens, self.types)])
+        return f"[{items}]"
     
     @staticmethod
-    def int(literal: str):
+    def int(literal: str) -> "Expression":
         expr = Expression()
         token = Token(literal, TokenType.INTEGER, -1)
         expr.pushval(token, BASTypes.INT)
         return expr
     
     @staticmethod
-    def string(literal: str):
+    def string(literal: str) -> "Expression":
         expr = Expression()
         token = Token(literal, TokenType.STRING, -1)
         expr.pushval(token, BASTypes.STR)
         return expr
 
     @staticmethod
-    def real(literal: str):
+    def real(literal: str) -> "Expression":
         expr = Expression()
         token = Token(literal, TokenType.REAL, -1)
         expr.pushval(token, BASTypes.REAL)
@@ -470,47 +506,49 @@ class Symbol:
     symbols can be variables or labels. Variables point to values
     of type INT, REAL or STR.
     """
+    __slots__ = ('symbol', 'symtype', 'value', 'valtype', 'temporal', 'puts', 'gets')
 
     def __init__(self, sname: str, stype: SymTypes) -> None:
         self.symbol = sname
         self.symtype = stype
-        self.value: List[Tuple[Token,BASTypes]] = []
+        self.value: List[Token] = []
         self.valtype = BASTypes.NONE
         self.temporal = False
         self.puts = 0
         self.gets = 0
     
-    def set_value(self, expr: Expression):
-        self.value = expr.expr
+    def set_value(self, expr: Expression) -> None:
+        self.value = expr.tokens
         self.valtype = expr.restype
         self.inc_writes()
     
     def is_ident(self) -> bool:
-        return self.symtype == SymTypes.SYMVAR
+        return self.symtype is SymTypes.SYMVAR
     
     def is_label(self) -> bool:
-        return self.symtype == SymTypes.SYMLAB
+        return self.symtype is SymTypes.SYMLAB
     
     def is_constant(self) -> bool:
-        return self.puts == 1 and self.is_ident() and len(self.value) == 1
+        return self.puts == 1 and self.symtype is SymTypes.SYMVAR and len(self.value) == 1
 
     def is_tmp(self) -> bool:
-        return self.symbol.startswith('var_tmp')
+        # temporal flag is set by the parser when it creates the variable
+        return self.temporal and self.symtype is SymTypes.SYMVAR
 
-    def inc_reads(self):
+    def inc_reads(self) -> None:
         """ To control the number of times the symbol value is used """
         self.gets = self.gets + 1
 
-    def inc_writes(self):
+    def inc_writes(self) -> None:
         """ To control the number of times the symbol value is changed """
         self.puts = self.puts + 1
 
     def is_compatible(self, bastype: BASTypes) -> bool:
-        if bastype == BASTypes.STR:
+        if bastype is BASTypes.STR:
             # string type must be declared explicity with $ at the end so
             # NONE is not valid in this case
-            return self.valtype == BASTypes.STR
-        return self.valtype == BASTypes.NONE or self.valtype == bastype
+            return self.valtype is BASTypes.STR
+        return self.valtype is BASTypes.NONE or self.valtype is bastype
 
     def print(self) -> None:
         print(self.symbol + ' -', self.symtype, ':', self.valtype, self.value)
@@ -521,11 +559,15 @@ class Symbol:
 
 class SymbolTable:
     """ table of symbols found during the compilation process """
+    __slots__ = ('symbols',)
 
     def __init__(self) -> None:
         self.symbols: Dict[str, Symbol] = {}
     
     def add(self, sname: str, stype: SymTypes) -> Symbol:
+        # interned so lookups with the (interned) names from the parser
+        # compare keys by identity
+        sname = sys.intern(sname)
         symbol = Symbol(sname, stype)
         self.symbols[sname] = symbol
         return symbol
@@ -534,13 +576,15 @@ class SymbolTable:
         return self.symbols[sname]
 
     def search(self, sname: str) -> Optional[Symbol]:
-        if sname in self.symbols.keys():
-            return self.symbols[sname]
-        return None
+        return self.symbols.get(sname)
 
     def getsymbols(self) -> List[str]:
         return list(self.symbols.keys())
 
+    def getentries(self) -> Iterable[Symbol]:
+        """ Live view of the symbols in insertion order, no copy is made """
+        return self.symbols.values()
+
 class CodeBlockType(enum.Enum):
     FOR     = 1
     WHILE   = 2
@@ -558,6 +602,8 @@ class CodeBlock:
     WHILE <expression> <codeblock> WEND
     IF <condition> THEN <codeblock> [ELSE <codeblock>] IFEND
     """
+    __slots__ = ('type', 'startlabel', 'endlabel', 'blockinfo')
+
     def __init__(self, type: CodeBlockType, startlabel: Optional[Symbol], endlabel: Optional[Symbol]) -> None:
         self.type = type
         self.startlabel = startlabel
@@ -77,8 +77,8 @@ class Z80Backend:
 
     def _emitrealsym(self, sym: Symbol) -> None:
         codedreal = bytearray(0 for i in range(5))
-        if sym.is_constant() and sym.is_tmp():
-            codedreal = self._real(sym.value[0][0].text)
+        if sym.is_tmp() and sym.is_constant():
+            codedreal = self._real(sym.value[0].text)
         code = f'{sym.symbol}: db '
         for b in codedreal:
             code = code + f'&{b:02X},'
@@ -96,7 +96,7 @@ class Z80Backend:
         if fname not in self.libs:
             self.libs.append(fname)
             fcode: List[str] = lib[fname]
-            self.libcode = self.libcode + fcode
+            self.libcode.extend(fcode)
             return True
         return False
 
@@ -128,9 +128,10 @@ class Z80Backend:
         elif inst in SM2Z80:
             self._emitauxcode(inst)
             code: List[str] = SM2Z80[inst]
-            for line in code:
-                if arg != '': line = line.replace('$ARG1', arg)
-                self.code.append(prefix + line + '\n')
+            if arg != '':
+                self.code.extend([f"{prefix}{line.replace('$ARG1', arg)}\n" for line in code])
+            else:
+                self.code.extend([f"{prefix}{line}\n" for line in code])
         else:
             self.abort(f"intermediate op-code {inst} is unknown")
 
@@ -146,22 +147,21 @@ class Z80Backend:
 
     def generatecode(self, orgaddr: int) -> None:
         self.code.append('org &%04X\n' % orgaddr)
-        self.code = self.code + ["\n","; CODE AREA\n", "\n"]
+        self.code.extend(["\n","; CODE AREA\n", "\n"])
 
         for inst, arg, prefix in self.icode:
             self.emitcode(inst, arg, prefix)
 
     def generatesymbols(self) -> None:
         assert self.symbols is not None
-        for symname in self.symbols.getsymbols():
-            symbol = self.symbols.get(symname)
-            if symbol.valtype == BASTypes.INT:
+        for symbol in self.symbols.getentries():
+            if symbol.valtype is BASTypes.INT:
                 self.emitdata(f'{symbol.symbol}: dw &00')
-            elif symbol.valtype == BASTypes.REAL:
+            elif symbol.valtype is BASTypes.REAL:
                 self._emitrealsym(symbol)
-            elif symbol.valtype == BASTypes.STR:
-                if symbol.is_constant() and symbol.is_tmp():
-                    self.emitdata(f'{symbol.symbol}: db "{symbol.value[0][0].text}",&00')
+            elif symbol.valtype is BASTypes.STR:
+                if symbol.is_tmp() and symbol.is_constant():
+                    self.emitdata(f'{symbol.symbol}: db "{symbol.value[0].text}",&00')
                 else:    
                     self.emitdata(f'{symbol.symbol}: defs 256')
             else:
@@ -180,9 +180,9 @@ class Z80Backend:
         self.generatesymbols()
         self.generatecode(startaddr)
         with open(outputfile, "w") as fd:
-            fd.writelines(self.code)
-            fd.writelines(self.libcode)
-            fd.writelines(self.data)
+            fd.write(''.join(self.code))
+            fd.write(''.join(self.libcode))
+            fd.write(''.join(self.data))
 
     # BASIC commands and functions
 